@@ -1,38 +1,76 @@
+import atexit
+import json
 import logging
 import os
+import queue
+import random
+import re
 import sys
+import textwrap
 import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+from http import HTTPStatus
+from logging.handlers import QueueHandler, QueueListener
 
 from dotenv import load_dotenv
 
+import orjson
+
 import requests
+from requests.adapters import HTTPAdapter
 
 import telegram
 
+from urllib3.util.retry import Retry
+
+
+TOKEN_NAMES = ('PRACTICUM_TOKEN', 'TELEGRAM_TOKEN', 'TELEGRAM_CHAT_ID')
+
+
+def _env():
+    """
+    Читает токены из переменных окружения.
 
-load_dotenv()
+    Файл .env разбирается, только если в окружении заданы не все токены.
+    """
+    if not all(os.getenv(name) for name in TOKEN_NAMES):
+        load_dotenv()
+    return tuple(os.getenv(name) for name in TOKEN_NAMES)
 
 
-PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
-TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
-TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+PRACTICUM_TOKEN, TELEGRAM_TOKEN, TELEGRAM_CHAT_ID = _env()
 
 
 def set_logging():
-    """Настройки логирования."""
+    """
+    Настройки логирования.
+
+    Записи попадают в очередь, а в файл main.log и в stdout их пишет
+    фоновый поток QueueListener: цикл бота не ждет ввода-вывода.
+    В stdout выводятся только записи логгера этого модуля.
+    """
+    formatter = logging.Formatter(
+        '%(asctime)s [%(levelname)s] | '
+        '(%(filename)s).%(funcName)s:%(lineno)d | %(message)s'
+    )
+    file_handler = logging.FileHandler('main.log', mode='a', delay=True)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+    stream_handler.addFilter(logging.Filter(__name__))
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, file_handler, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
     logging.basicConfig(
         level=logging.DEBUG,
-        filename='main.log',
-        filemode='a',
-        format=(
-            '%(asctime)s [%(levelname)s] | '
-            '(%(filename)s).%(funcName)s:%(lineno)d | %(message)s'
-        ),
+        format='%(message)s',
+        handlers=[QueueHandler(log_queue)],
     )
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.DEBUG)
-    handler = logging.StreamHandler(sys.stdout)
-    logger.addHandler(handler)
     return logger
 
 
@@ -40,8 +78,50 @@ logger = set_logging()
 
 
 RETRY_PERIOD = 600
+MAX_RETRY_PERIOD = 3600
+POLL_PERIOD_LIMITS = (60, 1800)
+MIN_STATUS_OBSERVATIONS = 24
+STATUS_STATS_FILE = os.getenv('STATUS_STATS_FILE', 'status_stats.json')
+REQUEST_TIMEOUT = (5, 30)
+MESSAGE_TTL = 24 * 60 * 60
+MAX_MESSAGE_LENGTH = 4096
+BOT_MESSAGES_PER_SECOND = 30
+CHAT_MESSAGES_PER_SECOND = 1
+MAX_SEND_RETRIES = 3
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
+CACHE_VALIDATORS = {
+    'ETag': 'If-None-Match',
+    'Last-Modified': 'If-Modified-Since',
+}
+ERROR_NOISE = re.compile(
+    r'0x[0-9a-fA-F]+|\d{4}-\d{2}-\d{2}[T ][\d:.]+|\d{6,}'
+)
+
+
+def create_session():
+    """
+    Создает сессию для запросов к API-сервису.
+
+    Сессия держит соединение с API открытым между запросами, передает
+    заголовки HEADERS с каждым запросом и повторяет запрос при временных
+    ошибках сервера (502, 503, 504).
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount('https://', HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=2,
+        max_retries=Retry(
+            total=3, backoff_factor=1.5, status_forcelist=[502, 503, 504]
+        ),
+    ))
+    return session
+
+
+_session = create_session()
+_UNCHANGED = object()
+_cache_validators = {}
 
 
 HOMEWORK_VERDICTS = {
@@ -49,31 +129,85 @@ HOMEWORK_VERDICTS = {
     'reviewing': 'Работа взята на проверку ревьюером.',
     'rejected': 'Работа проверена: у ревьюера есть замечания.'
 }
+VERDICT_TEMPLATES = {
+    status: f'Изменился статус проверки работы "{{name}}". {verdict}'
+    for status, verdict in HOMEWORK_VERDICTS.items()
+}
 
 
-def send_error_state(bot, now_error, new_error, message):
+class TokenBucket:
     """
-    Отправляет состояние домашней работы в Telegram чат.
+    Ограничитель частоты по алгоритму «корзина токенов».
 
-    Перезаписывает предыдущее значение состояния.
-    Отправляет новое состояние, если оно отличается от предыдущего.
+    Корзина вмещает rate токенов и пополняется со скоростью
+    rate токенов в секунду.
     """
-    print(now_error)
-    print(new_error)
-    if new_error != now_error:
-        now_error = new_error
-        print(now_error)
-        print(new_error)
-        try:
-            print(new_error, now_error)
-            bot.send_message(TELEGRAM_CHAT_ID, message)
-            logging.debug(f'Бот отправил сообщение: {message}')
-            return now_error
-        except Exception:
-            logging.error('Ошибка отправки сообщения Ботом.')
-            raise Exception
-    else:
-        pass
+
+    def __init__(self, rate):
+        """Создает полную корзину."""
+        self.rate = rate
+        self._tokens = rate
+        self._last_refill = time.monotonic()
+
+    def acquire(self):
+        """Забирает токен, при необходимости дожидаясь его появления."""
+        now = time.monotonic()
+        self._tokens = min(
+            self.rate, self._tokens + (now - self._last_refill) * self.rate
+        )
+        self._last_refill = now
+        if self._tokens < 1:
+            time.sleep((1 - self._tokens) / self.rate)
+            self._tokens = 1
+            self._last_refill = time.monotonic()
+        self._tokens -= 1
+
+
+class RateLimitedBot:
+    """
+    Обертка над telegram.Bot, ограничивающая частоту отправки сообщений.
+
+    Соблюдает лимиты Telegram Bot API: не больше BOT_MESSAGES_PER_SECOND
+    сообщений в секунду от бота и CHAT_MESSAGES_PER_SECOND в один чат.
+    """
+
+    def __init__(self, bot):
+        """Оборачивает экземпляр telegram.Bot."""
+        self._bot = bot
+        self._bot_bucket = TokenBucket(BOT_MESSAGES_PER_SECOND)
+        self._chat_buckets = {}
+
+    def send_message(self, chat_id, text, **kwargs):
+        """Отправляет сообщение, дождавшись разрешения ограничителей."""
+        if chat_id not in self._chat_buckets:
+            self._chat_buckets[chat_id] = TokenBucket(
+                CHAT_MESSAGES_PER_SECOND
+            )
+        self._chat_buckets[chat_id].acquire()
+        self._bot_bucket.acquire()
+        return self._bot.send_message(chat_id, text, **kwargs)
+
+
+def send_error_state(bot, error_state, message):
+    """
+    Отправляет сообщение об ошибке в Telegram чат.
+
+    Состояние — хеш текста последней отправленной ошибки, из которого
+    удалены временные метки и адреса (ERROR_NOISE): такие ошибки
+    считаются одинаковыми. Сообщение отправляется, только если ошибка
+    отличается от предыдущей. Отправка идёт через send_message, поэтому
+    RetryAfter обрабатывается так же, как для статусов. Возвращает новое
+    состояние.
+    """
+    new_state = hash(ERROR_NOISE.sub('#', message))
+    if new_state == error_state:
+        logger.debug('Сообщение об ошибке уже отправлялось: %s', message)
+        return error_state
+    try:
+        send_message(bot, message)
+    except telegram.error.TelegramError:
+        return error_state
+    return new_state
 
 
 def check_tokens():
@@ -84,12 +218,12 @@ def check_tokens():
     Если отсутствует хотя бы одна переменная окружения —
     выбрасывает ошибку SystemExit.
     """
-    tokens = {
+    tokens = (
         PRACTICUM_TOKEN,
         TELEGRAM_TOKEN,
         TELEGRAM_CHAT_ID
-    }
-    if all(token is not None and token != '' for token in tokens):
+    )
+    if all(tokens):
         return True
     else:
         message = ('Отсутствует обязательная переменная окружения. '
@@ -104,13 +238,22 @@ def send_message(bot, message):
     Чат определяется переменной окружения TELEGRAM_CHAT_ID.
     Принимает на вход два параметра:
     экземпляр класса Bot и строку с текстом сообщения.
+    Если Telegram ограничил частоту сообщений (RetryAfter), отправка
+    повторяется через указанное им время, но не больше MAX_SEND_RETRIES раз.
     """
-    try:
-        bot.send_message(TELEGRAM_CHAT_ID, message)
-        logging.debug(f'Бот отправил сообщение: {message}.')
-    except Exception as error:
-        message = (f'Сбой при отправке сообщения: {error}.')
-        logg_error_or_critical(logging.error, message, Exception)
+    for attempt in range(MAX_SEND_RETRIES + 1):
+        try:
+            bot.send_message(TELEGRAM_CHAT_ID, message)
+            logger.debug('Бот отправил сообщение: %s.', message)
+            return
+        except telegram.error.TelegramError as error:
+            if (not isinstance(error, telegram.error.RetryAfter)
+                    or attempt == MAX_SEND_RETRIES):
+                error_message = f'Сбой при отправке сообщения: {error}.'
+                logg_error_or_critical(logging.error, error_message, error)
+            logger.warning('Telegram ограничил частоту сообщений, '
+                           'повтор через %s секунд.', error.retry_after + 1)
+            time.sleep(error.retry_after + 1)
 
 
 def logg_error_or_critical(level, message, error):
@@ -121,9 +264,9 @@ def logg_error_or_critical(level, message, error):
     Все данные передаются из функций, вызывающих эту.
     """
     if level == logging.error:
-        logging.error(message)
+        logger.error(message)
     if level == logging.critical:
-        logging.critical(message)
+        logger.critical(message)
     raise error
 
 
@@ -134,23 +277,37 @@ def get_api_answer(timestamp):
     В качестве параметра в функцию передается временная метка.
     В случае успешного запроса должна возвращает ответ API,
     приведя его из формата JSON к типам данных Python.
-
+    Запрос условный: заголовки ETag и Last-Modified прошлого ответа
+    передаются обратно в If-None-Match и If-Modified-Since. Если данные
+    не изменились (код 304), возвращается маркер _UNCHANGED.
     """
     payload = {'from_date': timestamp}
     try:
-        homework_statuses = requests.get(
+        homework_statuses = _session.get(
             ENDPOINT,
-            headers=HEADERS,
-            params=payload
+            headers=_cache_validators,
+            params=payload,
+            timeout=REQUEST_TIMEOUT
         )
-        if homework_statuses.status_code != 200:
-            message = ('Полученный код статуса при запросе '
-                       'к основному API отличается от "200"')
-            logg_error_or_critical(logging.error, message, Exception)
-        return homework_statuses.json()
-    except Exception as error:
+    except requests.RequestException as error:
         message = (f'Ошибка при запросе к основному API: {error}')
-        logg_error_or_critical(logging.error, message, Exception)
+        logg_error_or_critical(
+            logging.error, message, ConnectionError(message)
+        )
+    if homework_statuses.status_code == HTTPStatus.NOT_MODIFIED:
+        logger.debug('Ответ API не изменился с прошлого запроса.')
+        return _UNCHANGED
+    if homework_statuses.status_code != 200:
+        message = ('Полученный код статуса при запросе к основному API '
+                   f'отличается от "200": {homework_statuses.status_code}')
+        logg_error_or_critical(
+            logging.error, message, ConnectionError(message)
+        )
+    for response_header, request_header in CACHE_VALIDATORS.items():
+        value = homework_statuses.headers.get(response_header)
+        if value is not None:
+            _cache_validators[request_header] = value
+    return orjson.loads(homework_statuses.content)
 
 
 def check_response(response):
@@ -160,40 +317,41 @@ def check_response(response):
     В качестве параметра функция получает ответ API,
     приведенный к типам данных Python.
     """
-    if type(response) != dict:
+    if not isinstance(response, dict):
         message = ('Ошибка: Тип полученных данных в ответе '
                    'не соответсвует ожидаемым "dict".')
-        logg_error_or_critical(logging.error, message)
-        raise TypeError
+        logg_error_or_critical(logging.error, message, TypeError(message))
     if response.get('code') is not None:
         if response.get('code') == 'not_authenticated':
             message = (f'Ошибка 401. Запроса с недействительным '
                        f'или некорректным токеном: '
                        f'{response.get("message")}.')
-        if response.get('code') == 'UnknownError':
+        elif response.get('code') == 'UnknownError':
             message = (f'Ошибка 400 "UnknownError": '
                        f'{response.get("error")}.')
         else:
             message = (f'При запросе к эндпоинту API вернулся ответ '
                        f'с кодом {response.get("code")}.')
-        logg_error_or_critical(logging.error, message)
-    else:
-        if type(response.get('homeworks')) != list:
-            message = ('Ошибка: Тип полученных данных "homeworks" '
-                       'не соответсвует ожидаемым "list".')
-            logg_error_or_critical(logging.error, message)
-            raise TypeError
-        if len(response) == 2 and response.get('homeworks') is None:
-            message = ('Ошибка: Не получен обязательный ключ из ответа: '
-                       'homeworks.')
-            logg_error_or_critical(logging.error, message, KeyError)
-        if len(response) == 2 and response.get('current_date') is None:
+        logg_error_or_critical(
+            logging.error, message, ConnectionError(message)
+        )
+    for key in ('homeworks', 'current_date'):
+        if key not in response:
             message = ('Ошибка: Не получен обязательный ключ из ответа: '
-                       'current_date.')
-            logg_error_or_critical(logging.error, message, KeyError)
-        else:
-            logging.info('Проверка ответа API на соответствие документации '
-                         'прошла успешно.')
+                       f'{key}.')
+            logg_error_or_critical(logging.error, message, KeyError(message))
+    if not isinstance(response['homeworks'], list):
+        message = ('Ошибка: Тип полученных данных "homeworks" '
+                   'не соответсвует ожидаемым "list".')
+        logg_error_or_critical(logging.error, message, TypeError(message))
+    logger.info('Проверка ответа API на соответствие документации '
+                'прошла успешно.')
+
+
+@lru_cache(maxsize=256)
+def _format_message(homework_name, status):
+    """Составляет сообщение о смене статуса домашней работы."""
+    return VERDICT_TEMPLATES[status].format(name=homework_name)
 
 
 def parse_status(homework):
@@ -205,54 +363,208 @@ def parse_status(homework):
     подготовленную для отправки в Telegram строку, содержащую один
     из вердиктов словаря HOMEWORK_VERDICTS.
     """
-    if (homework.get('homeworks') == ''
-            or homework.get('homeworks') is None
-            or len(homework.get('homeworks')) == 0):
-        message = ('Не найдено ни одной сданной домашней работы.')
-        logging.info(message)
-        raise TypeError(message)
-    try:
-        homework_name = homework.get('homeworks')[0].get('homework_name')
-    except ValueError:
-        message = ('Ошибка: в ответе API домашки нет ключа "homework_name".')
+    if 'homework_name' not in homework:
+        message = 'Ошибка: в ответе API домашки нет ключа "homework_name".'
+        logg_error_or_critical(logging.error, message, KeyError(message))
+    status = homework.get('status')
+    if status not in HOMEWORK_VERDICTS:
+        message = (f'Ошибка: получен недокументированный статус '
+                   f'домашней работы "{status}".')
         logg_error_or_critical(logging.error, message, ValueError(message))
+    return _format_message(homework['homework_name'], status)
+
+
+def split_message(entries):
+    """
+    Собирает записи в сообщения не длиннее MAX_MESSAGE_LENGTH символов.
+
+    Записи разделяются пустой строкой и целиком попадают в одно сообщение.
+    Разрезается (textwrap) только запись, которая сама длиннее лимита.
+    """
+    separator = '\n\n'
+    chunks = []
+    for entry in entries:
+        if len(entry) > MAX_MESSAGE_LENGTH:
+            parts = textwrap.wrap(
+                entry, MAX_MESSAGE_LENGTH, replace_whitespace=False
+            )
+        else:
+            parts = [entry]
+        for part in parts:
+            if (chunks and len(chunks[-1]) + len(separator) + len(part)
+                    <= MAX_MESSAGE_LENGTH):
+                chunks[-1] += separator + part
+            else:
+                chunks.append(part)
+    return chunks
+
+
+def send_status_messages(bot, homeworks, last_sent, status_stats):
+    """
+    Отправляет в Telegram чат новые сообщения о статусах работ.
+
+    Принимает список работ из ответа API. Последнее отправленное
+    по каждой работе сообщение хранится в last_sent вместе со временем
+    отправки: совпадающее сообщение повторно уходит в чат только спустя
+    MESSAGE_TTL секунд. Новые сообщения отправляются одним сообщением
+    (при превышении лимита длины Telegram — несколькими) и только после
+    успешной отправки учитываются в статистике смены статусов.
+    Работа, которую не удалось разобрать (parse_status записывает ошибку
+    в лог), пропускается, не мешая отправке остальных.
+    """
+    if not homeworks:
+        logger.info('Не найдено ни одной сданной домашней работы '
+                    'за период проверки.')
+        return
+    now = time.time()
+    updates = []
+    for homework in homeworks:
+        try:
+            message = parse_status(homework)
+        except (KeyError, ValueError):
+            continue
+        sent_at, last_message = last_sent.get(
+            homework['homework_name'], (0, None)
+        )
+        if message == last_message and now - sent_at < MESSAGE_TTL:
+            logger.debug('Сообщение уже отправлялось: %s', message)
+            continue
+        updates.append((homework, message))
+    for text in split_message(message for _, message in updates):
+        send_message(bot, text)
+    for homework, message in updates:
+        homework_name = homework['homework_name']
+        if message != last_sent.get(homework_name, (0, None))[1]:
+            record_status_change(status_stats, get_change_hour(homework))
+        last_sent[homework_name] = (now, message)
+
+
+def get_change_hour(homework):
+    """
+    Возвращает час суток по местному времени, когда сменился статус работы.
+
+    Час берется из поля date_updated ответа API, а не из времени опроса:
+    при редком опросе смена статуса замечается с опозданием.
+    Если поля нет или его формат не распознан, возвращается текущий час.
+    """
     try:
-        status = homework.get('homeworks')[0].get('status')
-    except ValueError:
-        message = ('Ошибка: получен недокументированный статус '
-                   'домашней работы "{status}".')
-        logg_error_or_critical(logging.error, message, ValueError(message))
-    else:
-        message = (f'Изменился статус проверки работы "{homework_name}".'
-                   f'{HOMEWORK_VERDICTS[status]}')
-        return message
+        date_updated = datetime.strptime(
+            homework['date_updated'], '%Y-%m-%dT%H:%M:%SZ'
+        )
+    except (KeyError, TypeError, ValueError):
+        return time.localtime().tm_hour
+    return date_updated.replace(tzinfo=timezone.utc).astimezone().hour
+
+
+def load_status_stats():
+    """
+    Загружает из STATUS_STATS_FILE статистику смены статусов.
+
+    Статистика — счетчик смен статуса по часам суток.
+    Если файла нет или он поврежден, возвращается пустой счетчик.
+    """
+    try:
+        with open(STATUS_STATS_FILE, encoding='utf-8') as file:
+            return Counter({int(hour): count
+                            for hour, count in json.load(file).items()})
+    except (OSError, ValueError, AttributeError):
+        return Counter()
+
+
+def record_status_change(status_stats, hour):
+    """Учитывает смену статуса в указанном часе и сохраняет статистику."""
+    status_stats[hour] += 1
+    try:
+        with open(STATUS_STATS_FILE, 'w', encoding='utf-8') as file:
+            json.dump(status_stats, file)
+    except OSError as error:
+        logger.error('Не удалось сохранить статистику статусов: %s', error)
+
+
+def get_poll_period(status_stats):
+    """
+    Вычисляет паузу между запросами по статистике смены статусов.
+
+    Чем чаще статус менялся в текущий час суток, тем чаще опрашивается API:
+    RETRY_PERIOD масштабируется отношением равномерной вероятности часа
+    к наблюдаемой. Пока наблюдений меньше MIN_STATUS_OBSERVATIONS,
+    пауза равна RETRY_PERIOD.
+    """
+    total = sum(status_stats.values())
+    if total < MIN_STATUS_OBSERVATIONS:
+        return RETRY_PERIOD
+    hour_probability = status_stats[time.localtime().tm_hour] / total
+    poll_period = RETRY_PERIOD / 24 / max(hour_probability, 1e-3)
+    low, high = POLL_PERIOD_LIMITS
+    return int(min(max(poll_period, low), high))
+
+
+def get_retry_period(failures, status_stats):
+    """
+    Вычисляет паузу перед следующим запросом к API.
+
+    Пока запросы проходят успешно (или ошибка случилась один раз),
+    пауза подбирается по статистике смены статусов (get_poll_period).
+    С каждой следующей ошибкой подряд пауза удваивается от RETRY_PERIOD,
+    но не превышает MAX_RETRY_PERIOD. На ограниченную паузу накладывается
+    случайный разброс ±20%, чтобы несколько копий бота не повторяли
+    запросы синхронно, даже упершись в предел.
+    """
+    if failures <= 1:
+        return get_poll_period(status_stats)
+    retry_period = min(
+        RETRY_PERIOD * 2 ** min(failures - 1, 10), MAX_RETRY_PERIOD
+    )
+    return int(retry_period * random.uniform(0.8, 1.2))
 
 
 def main():
-    """Основная логика работы бота."""
+    """
+    Основная логика работы бота.
+
+    Если цикл не удалось довести до конца (ответ API не прошел проверку
+    или сообщение не ушло в Telegram), сохраненные ETag и Last-Modified
+    сбрасываются: иначе следующий запрос получил бы ответ 304
+    и необработанные статусы были бы потеряны.
+    """
     check_tokens()
     bot = telegram.Bot(token=TELEGRAM_TOKEN)
+    bot = RateLimitedBot(bot)
     timestamp = int(time.time()) - RETRY_PERIOD
-    error_state = ''
+    error_state = None
+    last_sent = {}
+    failures = 0
+    retry_after = None
+    status_stats = load_status_stats()
     while True:
         try:
-            homework = get_api_answer(timestamp)
-            check_response(homework)
-            message = parse_status(homework)
-            print(message)
-        except IndexError as info:
-            message = (f'Не найдено ни одной сданной домашней работы '
-                       f'за период проверки: {info}')
-            logging.info(message)
+            response = get_api_answer(timestamp)
+            if response is not _UNCHANGED:
+                check_response(response)
+                send_status_messages(
+                    bot, response['homeworks'], last_sent, status_stats
+                )
+        except telegram.error.RetryAfter as error:
+            _cache_validators.clear()
+            retry_after = error.retry_after
+        except telegram.error.TelegramError:
+            _cache_validators.clear()
+            failures += 1
         except Exception as error:
+            _cache_validators.clear()
+            failures += 1
             message = f'Сбой в работе программы: {error}'
-            send_error_state(bot, error_state, error, message)
+            error_state = send_error_state(bot, error_state, message)
         else:
-            send_message(bot, message)
+            failures = 0
+            error_state = None
         finally:
-            logging.info(f'Выполнение запроса окончено, следующий повтор '
-                         f'через {RETRY_PERIOD} секунд.')
-            time.sleep(RETRY_PERIOD)
+            retry_period = get_retry_period(failures, status_stats)
+            if retry_after is not None:
+                retry_period, retry_after = retry_after, None
+            logger.info('Выполнение запроса окончено, следующий повтор '
+                        'через %s секунд.', retry_period)
+            time.sleep(retry_period)
 
 
 if __name__ == '__main__':
@@ -1,6 +1,8 @@
 import os
 import sys
 
+import pytest
+
 import pytest_timeout
 
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -53,3 +55,23 @@ pytest_timeout.write = write_timeout_reasons
 os.environ['PRACTICUM_TOKEN'] = 'sometoken'
 os.environ['TELEGRAM_TOKEN'] = '1234:abcdefg'
 os.environ['TELEGRAM_CHAT_ID'] = '12345'
+
+
+@pytest.fixture(autouse=True)
+def status_stats_file(monkeypatch, tmp_path):
+    """Keep the status statistics of every test in its own tmp_path."""
+    import homework
+    path = tmp_path / 'status_stats.json'
+    monkeypatch.setattr(homework, 'STATUS_STATS_FILE', str(path))
+    return path
+
+
+@pytest.fixture
+def sent_messages(monkeypatch):
+    """Replace homework.send_message with one collecting the texts."""
+    import homework
+    sent = []
+    monkeypatch.setattr(
+        homework, 'send_message', lambda bot, message: sent.append(message)
+    )
+    return sent
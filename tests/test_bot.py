@@ -3,6 +3,8 @@ import logging
 import platform
 import re
 import time
+from collections import Counter
+from datetime import datetime, timezone
 from http import HTTPStatus
 
 import pytest
@@ -172,14 +174,15 @@ class TestHomework:
             assert url.startswith(expected_url), (
                 'Проверьте адрес, на который отправляются запросы.'
             )
-            assert 'headers' in kwargs, (
-                'Проверьте, что в запрос к API передан заголовок.'
-            )
-            assert 'Authorization' in kwargs['headers'], (
+            headers = {
+                **homework_module._session.headers,
+                **kwargs.get('headers', {})
+            }
+            assert 'Authorization' in headers, (
                 'Проверьте, что в заголовках запроса передано поле '
                 '`Authorization`.'
             )
-            assert kwargs['headers']['Authorization'].startswith('OAuth '), (
+            assert headers['Authorization'].startswith('OAuth '), (
                 'Проверьте, что заголовок `Authorization` '
                 'начинается с `OAuth`.'
             )
@@ -200,7 +203,7 @@ class TestHomework:
                     'Проверьте, что в параметре `from_date` передано число.'
                 )
 
-        monkeypatch.setattr(requests, 'get', check_request_call)
+        monkeypatch.setattr(homework_module._session, 'get', check_request_call)
         try:
             homework_module.get_api_answer(current_timestamp)
         except AssertionError:
@@ -223,7 +226,7 @@ class TestHomework:
                 current_timestamp=current_timestamp, **kwargs
             )
 
-        monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr(homework_module._session, 'get', mock_response_get)
 
         result = homework_module.get_api_answer(current_timestamp)
         assert isinstance(result, dict), (
@@ -243,7 +246,7 @@ class TestHomework:
             self.HOMEWORK_FUNC_WITH_PARAMS_QTY[func_name]
         )
 
-        monkeypatch.setattr(requests, 'get', response)
+        monkeypatch.setattr(homework_module._session, 'get', response)
         try:
             homework_module.get_api_answer(current_timestamp)
         except Exception:
@@ -267,7 +270,9 @@ class TestHomework:
         def mock_request_get_with_exception(*args, **kwargs):
             raise requests.RequestException('Something wrong')
 
-        monkeypatch.setattr(requests, 'get', mock_request_get_with_exception)
+        monkeypatch.setattr(
+            homework_module._session, 'get', mock_request_get_with_exception
+        )
         try:
             homework_module.get_api_answer(current_timestamp)
         except requests.RequestException as e:
@@ -279,6 +284,72 @@ class TestHomework:
         except Exception:
             pass
 
+    def test_get_api_answer_not_modified(self, monkeypatch, random_timestamp,
+                                         current_timestamp, homework_module):
+        monkeypatch.setattr(homework_module, '_cache_validators', {})
+        sent_headers = []
+
+        def mock_response_get(*args, **kwargs):
+            sent_headers.append(kwargs['headers'])
+            if 'If-None-Match' in kwargs['headers']:
+                response = utils.MockResponseGET(
+                    http_status=HTTPStatus.NOT_MODIFIED
+                )
+            else:
+                response = utils.MockResponseGET(
+                    random_timestamp=random_timestamp
+                )
+            response.headers = {
+                'ETag': '"abc"',
+                'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT',
+            }
+            return response
+
+        monkeypatch.setattr(homework_module._session, 'get', mock_response_get)
+
+        homework_module.get_api_answer(current_timestamp)
+        result = homework_module.get_api_answer(current_timestamp)
+        assert sent_headers[1].get('If-None-Match') == '"abc"', (
+            'Проверьте, что повторный запрос передаёт полученный ETag '
+            'в заголовке `If-None-Match`.'
+        )
+        assert (
+            sent_headers[1].get('If-Modified-Since')
+            == 'Wed, 21 Oct 2015 07:28:00 GMT'
+        ), (
+            'Проверьте, что повторный запрос передаёт полученный '
+            '`Last-Modified` в заголовке `If-Modified-Since`.'
+        )
+        assert result is homework_module._UNCHANGED, (
+            'Проверьте, что ответ с кодом 304 не считается ошибкой.'
+        )
+
+    def test_api_errors_carry_message(self, monkeypatch, current_timestamp,
+                                      homework_module):
+        monkeypatch.setattr(homework_module, '_cache_validators', {})
+        errors = []
+        for http_status in (HTTPStatus.INTERNAL_SERVER_ERROR,
+                            HTTPStatus.SERVICE_UNAVAILABLE):
+            monkeypatch.setattr(
+                homework_module._session, 'get',
+                lambda *args, status=http_status, **kwargs: (
+                    utils.MockResponseGET(http_status=status)
+                )
+            )
+            with pytest.raises(ConnectionError) as error:
+                homework_module.get_api_answer(current_timestamp)
+            errors.append(str(error.value))
+        assert errors[0] != errors[1], (
+            'Убедитесь, что сообщение об ошибке API содержит '
+            'полученный код статуса.'
+        )
+
+        with pytest.raises(ConnectionError, match='not a token'):
+            homework_module.check_response({
+                'code': 'not_authenticated',
+                'message': 'not a token',
+            })
+
     def test_parse_status_with_expected_statuses(self, homework_module):
         func_name = 'parse_status'
         utils.check_function(
@@ -491,6 +562,31 @@ class TestHomework:
                 'метод бота `send_message`.'
             )
 
+    def test_send_message_retry_after(self, monkeypatch, random_message,
+                                      caplog, homework_module):
+        sleeps = []
+        monkeypatch.setattr(time, 'sleep', sleeps.append)
+
+        class MockedBotWithRetryAfter(utils.MockTelegramBot):
+            def send_message(self, *args, **kwargs):
+                if not sleeps:
+                    raise telegram.error.RetryAfter(5)
+                super().send_message(*args, **kwargs)
+
+        bot = MockedBotWithRetryAfter(message=random_message)
+        with utils.check_logging(caplog, level=logging.WARNING, message=(
+                'Убедитесь, что ограничение частоты сообщений Telegram '
+                'логируется с уровнем `WARNING`.'
+        )):
+            homework_module.send_message(bot, 'Test_message_check')
+        assert sleeps == [6], (
+            'Убедитесь, что при `RetryAfter` бот ждёт указанное Telegram '
+            'время перед повторной отправкой.'
+        )
+        assert bot.is_message_sent, (
+            'Убедитесь, что после ожидания сообщение отправляется повторно.'
+        )
+
     def test_bot_initialized_in_main(self, homework_module):
         func_name = 'main'
         utils.check_function(
@@ -583,7 +679,7 @@ class TestHomework:
                 data=response_data
             ))
         monkeypatch.setattr(
-            requests,
+            homework_module._session,
             'get',
             mock_response_get_with_new_status
         )
@@ -638,7 +734,7 @@ class TestHomework:
                     if record.message == utils.MockResponseGET.CALLED_LOG_MSG
                 ]
                 assert log_record, (
-                    'Убедитесь, что бот использует функцию `requests.get()` '
+                    'Убедитесь, что бот использует сессию `requests.Session` '
                     'для отправки запроса к API домашки.'
                 )
 
@@ -772,6 +868,307 @@ class TestHomework:
                     'возникновении ошибки отправки сообщения в Телеграм.'
                 ) from e
 
+    def test_status_message_is_not_resent(self, sent_messages,
+                                          homework_module):
+        last_sent = {}
+        for status in ('reviewing', 'reviewing', 'approved'):
+            homework_module.send_status_messages(
+                None,
+                [{'homework_name': 'hw123', 'status': status}],
+                last_sent,
+                Counter()
+            )
+        assert (
+            len(sent_messages) == 2 and sent_messages[0] != sent_messages[1]
+        ), (
+            'Убедитесь, что одинаковое сообщение о статусе работы '
+            'не отправляется повторно.'
+        )
+
+    def test_bad_homework_does_not_block_batch(self, sent_messages, caplog,
+                                               homework_module):
+        homeworks = [
+            {'homework_name': 'hw1', 'status': 'unknown'},
+            {'status': 'approved'},
+            {'homework_name': 'hw2', 'status': 'approved'},
+        ]
+        with utils.check_logging(caplog, level=logging.ERROR, message=(
+                'Убедитесь, что работа с некорректными данными '
+                'логируется с уровнем `ERROR`.'
+        )):
+            homework_module.send_status_messages(
+                None, homeworks, {}, Counter()
+            )
+        assert sent_messages == [
+            homework_module.parse_status(homeworks[2])
+        ], (
+            'Убедитесь, что одна некорректная работа в ответе API '
+            'не мешает отправке статусов остальных.'
+        )
+
+    def test_status_change_counted_in_update_hour(self, sent_messages,
+                                                  homework_module):
+        date_updated = datetime(2020, 2, 13, 14, 40, 57, tzinfo=timezone.utc)
+        stats = Counter()
+        homework_module.send_status_messages(
+            None,
+            [{
+                'homework_name': 'hw123',
+                'status': 'approved',
+                'date_updated': date_updated.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            }],
+            {},
+            stats
+        )
+        assert stats == Counter({date_updated.astimezone().hour: 1}), (
+            'Убедитесь, что смена статуса учитывается в часе '
+            'из поля `date_updated`, а не в часе опроса.'
+        )
+
+    def test_status_change_counted_after_send(self, monkeypatch,
+                                              homework_module):
+        attempts = []
+
+        def mock_send_message_failing_three_times(bot, message):
+            attempts.append(message)
+            if len(attempts) <= 3:
+                raise telegram.error.TelegramError('Something wrong')
+
+        monkeypatch.setattr(
+            homework_module,
+            'send_message',
+            mock_send_message_failing_three_times
+        )
+        homeworks = [{'homework_name': 'hw123', 'status': 'approved'}]
+        last_sent = {}
+        stats = Counter()
+        for _ in range(3):
+            with pytest.raises(telegram.error.TelegramError):
+                homework_module.send_status_messages(
+                    None, homeworks, last_sent, stats
+                )
+        homework_module.send_status_messages(
+            None, homeworks, last_sent, stats
+        )
+        assert sum(stats.values()) == 1, (
+            'Убедитесь, что смена статуса учитывается в статистике '
+            'только после успешной отправки сообщения.'
+        )
+
+    def test_status_messages_are_batched(self, sent_messages,
+                                         homework_module):
+        homeworks = [
+            {'homework_name': f'hw{i}', 'status': 'approved'}
+            for i in range(100)
+        ]
+        homework_module.send_status_messages(None, homeworks, {}, Counter())
+        assert 1 < len(sent_messages) < len(homeworks), (
+            'Убедитесь, что сообщения о нескольких работах '
+            'объединяются в одно.'
+        )
+        assert all(len(text) <= 4096 for text in sent_messages), (
+            'Убедитесь, что длина сообщения не превышает лимит Telegram.'
+        )
+        expected = {homework_module.parse_status(hw) for hw in homeworks}
+        received = [
+            entry for text in sent_messages for entry in text.split('\n\n')
+        ]
+        assert sorted(received) == sorted(expected), (
+            'Убедитесь, что сообщение о статусе одной работы '
+            'не разрезается между несколькими сообщениями.'
+        )
+        long_entry = 'слово ' * 1000
+        assert all(
+            len(text) <= 4096
+            for text in homework_module.split_message([long_entry])
+        ), 'Убедитесь, что слишком длинная запись разбивается на части.'
+
+    def test_error_state_dedup(self, monkeypatch, random_message,
+                               homework_module):
+        bot = utils.MockTelegramBot(message=random_message)
+        state = homework_module.send_error_state(
+            bot, None, 'Сбой: timeout at 1700000000'
+        )
+        bot.is_message_sent = False
+        state = homework_module.send_error_state(
+            bot, state, 'Сбой: timeout at 1700000600'
+        )
+        assert not bot.is_message_sent, (
+            'Убедитесь, что одинаковые ошибки не отправляются повторно.'
+        )
+        homework_module.send_error_state(bot, state, 'Сбой: другой')
+        assert bot.is_message_sent, (
+            'Убедитесь, что новая ошибка отправляется в Telegram.'
+        )
+
+    def test_error_state_retry_after(self, monkeypatch, random_message,
+                                     homework_module):
+        sleeps = []
+        monkeypatch.setattr(time, 'sleep', sleeps.append)
+
+        class MockedBotWithRetryAfter(utils.MockTelegramBot):
+            def send_message(self, *args, **kwargs):
+                if not sleeps:
+                    raise telegram.error.RetryAfter(5)
+                super().send_message(*args, **kwargs)
+
+        bot = MockedBotWithRetryAfter(message=random_message)
+        state = homework_module.send_error_state(bot, None, 'Сбой: timeout')
+        assert sleeps == [6] and bot.is_message_sent, (
+            'Убедитесь, что сообщение об ошибке отправляется повторно '
+            'после ожидания, указанного в `RetryAfter`.'
+        )
+        assert state is not None, (
+            'Убедитесь, что доставленная после `RetryAfter` ошибка '
+            'запоминается и не отправляется повторно.'
+        )
+
+    def test_rate_limited_bot(self, monkeypatch, random_message,
+                              homework_module):
+        sleeps = []
+        monkeypatch.setattr(time, 'sleep', sleeps.append)
+        telegram_bot = utils.MockTelegramBot(message=random_message)
+        bot = homework_module.RateLimitedBot(telegram_bot)
+        bot.send_message('12345', 'first')
+        bot.send_message('12345', 'second')
+        assert telegram_bot.text == 'second', (
+            'Убедитесь, что `RateLimitedBot` передаёт сообщение '
+            'обёрнутому боту.'
+        )
+        assert len(sleeps) == 1 and 0 < sleeps[0] <= 1, (
+            'Убедитесь, что второе сообщение в тот же чат ждёт '
+            'освобождения лимита.'
+        )
+
+    def test_retry_period_backoff(self, homework_module):
+        stats = Counter()
+        assert homework_module.get_retry_period(0, stats) == self.RETRY_PERIOD
+        assert homework_module.get_retry_period(1, stats) == self.RETRY_PERIOD
+        assert (
+            self.RETRY_PERIOD * 2 * 0.8
+            <= homework_module.get_retry_period(2, stats)
+            <= self.RETRY_PERIOD * 2 * 1.2
+        ), 'Убедитесь, что пауза удваивается после повторной ошибки.'
+        capped_periods = {
+            homework_module.get_retry_period(1000, stats) for _ in range(50)
+        }
+        assert all(
+            homework_module.MAX_RETRY_PERIOD * 0.8
+            <= period
+            <= homework_module.MAX_RETRY_PERIOD * 1.2
+            for period in capped_periods
+        ), 'Убедитесь, что пауза ограничена `MAX_RETRY_PERIOD` (±20%).'
+        assert len(capped_periods) > 1, (
+            'Убедитесь, что разброс применяется и к предельной паузе.'
+        )
+
+    def test_poll_period_follows_status_stats(self, homework_module):
+        hour = time.localtime().tm_hour
+        low, high = homework_module.POLL_PERIOD_LIMITS
+        busy_hour = Counter({hour: 100})
+        quiet_hour = Counter({(hour + 12) % 24: 100})
+        assert homework_module.get_poll_period(busy_hour) == low, (
+            'Убедитесь, что в активные часы API опрашивается чаще.'
+        )
+        assert homework_module.get_poll_period(quiet_hour) == high, (
+            'Убедитесь, что в неактивные часы API опрашивается реже.'
+        )
+
+    def test_main_reports_error_again_after_not_modified(
+            self, monkeypatch, random_message, homework_module
+    ):
+        monkeypatch.setattr(homework_module, 'PRACTICUM_TOKEN', 'sometoken')
+        monkeypatch.setattr(homework_module, 'TELEGRAM_TOKEN', '1234:abcdefg')
+        monkeypatch.setattr(homework_module, 'TELEGRAM_CHAT_ID', '12345')
+        monkeypatch.setattr(homework_module, '_cache_validators', {})
+        statuses = iter((
+            HTTPStatus.INTERNAL_SERVER_ERROR,
+            HTTPStatus.NOT_MODIFIED,
+            HTTPStatus.NOT_MODIFIED,
+            HTTPStatus.INTERNAL_SERVER_ERROR,
+        ))
+        monkeypatch.setattr(
+            homework_module._session,
+            'get',
+            lambda *args, **kwargs: utils.MockResponseGET(
+                http_status=next(statuses)
+            )
+        )
+        sent = []
+
+        class MockedBotCountingMessages(utils.MockTelegramBot):
+            def send_message(self, chat_id=None, text=None, **kwargs):
+                sent.append(text)
+
+        monkeypatch.setattr(telegram, 'Bot', MockedBotCountingMessages)
+        monkeypatch.setattr(homework_module, 'RateLimitedBot', lambda bot: bot)
+        cycles = []
+
+        def sleep_to_interrupt(secs):
+            cycles.append(secs)
+            if len(cycles) == 4:
+                raise utils.BreakInfiniteLoop('break')
+
+        monkeypatch.setattr(time, 'sleep', sleep_to_interrupt)
+        with pytest.raises(utils.BreakInfiniteLoop):
+            homework_module.main()
+        assert len(sent) == 2, (
+            'Убедитесь, что ошибка, повторившаяся после успешных запросов '
+            '(в том числе с ответом 304), снова отправляется в Telegram.'
+        )
+
+    def test_main_delivers_status_after_failed_send_and_not_modified(
+            self, monkeypatch, random_timestamp, sent_messages,
+            homework_module
+    ):
+        monkeypatch.setattr(homework_module, 'PRACTICUM_TOKEN', 'sometoken')
+        monkeypatch.setattr(homework_module, 'TELEGRAM_TOKEN', '1234:abcdefg')
+        monkeypatch.setattr(homework_module, 'TELEGRAM_CHAT_ID', '12345')
+        monkeypatch.setattr(homework_module, '_cache_validators', {})
+        data = {
+            'homeworks': [{'homework_name': 'hw123', 'status': 'approved'}],
+            'current_date': random_timestamp
+        }
+
+        def mock_response_get(*args, headers=None, **kwargs):
+            if (headers or {}).get('If-None-Match') == '"abc"':
+                response = utils.MockResponseGET(
+                    http_status=HTTPStatus.NOT_MODIFIED
+                )
+            else:
+                response = utils.MockResponseGET(data=data)
+            response.headers = {'ETag': '"abc"'}
+            return response
+
+        monkeypatch.setattr(homework_module._session, 'get', mock_response_get)
+        failed_sends = []
+
+        def mock_send_message_failing_once(bot, message):
+            if not failed_sends:
+                failed_sends.append(message)
+                raise telegram.error.NetworkError('Something wrong')
+            sent_messages.append(message)
+
+        monkeypatch.setattr(
+            homework_module, 'send_message', mock_send_message_failing_once
+        )
+        monkeypatch.setattr(telegram, 'Bot', utils.MockTelegramBot)
+        cycles = []
+
+        def sleep_to_interrupt(secs):
+            cycles.append(secs)
+            if len(cycles) == 3:
+                raise utils.BreakInfiniteLoop('break')
+
+        monkeypatch.setattr(time, 'sleep', sleep_to_interrupt)
+        with pytest.raises(utils.BreakInfiniteLoop):
+            homework_module.main()
+        assert len(sent_messages) == 1, (
+            'Убедитесь, что статус, который не удалось отправить '
+            'в Telegram, отправляется повторно, даже если API '
+            'затем отвечает кодом 304.'
+        )
+
     def test_docstrings(self, homework_module):
         for func in self.HOMEWORK_FUNC_WITH_PARAMS_QTY:
             utils.check_docstring(homework_module, func)